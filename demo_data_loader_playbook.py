@@ -21,123 +21,341 @@ Or pass webhook as hive reference:
 """
 
 import json
+import re
 import time
-from datetime import datetime, timedelta
-from urllib.request import urlopen, Request
-from urllib.error import URLError, HTTPError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from jinja2 import Environment, BaseLoader
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Shared Jinja2 environment, built once per module load. from_string() does
+# not cache, so compiled templates are memoized per call in
+# process_json_template, not across invocations.
+_JINJA_ENV = Environment(loader=BaseLoader(), autoescape=False)
+
+# BSD syslog month names (fixed English, independent of locale)
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+           'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+# Plain {{ name }} substitution, with no filters, tags or expressions
+_SIMPLE_VAR_RE = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+# Upper bound on concurrent webhook requests from send_events_to_webhook
+MAX_CONCURRENCY = 10
+
+# Keep-alive session so consecutive webhook POSTs reuse one TLS connection;
+# sized so every send_events_to_webhook worker can hold its own connection
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=MAX_CONCURRENCY,
+    max_retries=Retry(total=2, backoff_factor=0.2),
+)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+# Fetched templates keyed by URL: {url: (etag, last_modified, body)}
+_TEMPLATE_CACHE = {}
+
+
+def _loads(data):
+    """
+    Parse JSON text, using orjson when it is installed.
+
+    Falls back to stdlib json for input orjson rejects (NaN, Infinity).
+    orjson parses integers beyond 64 bits as floats.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def _dumps(obj):
+    """
+    Serialize obj to JSON bytes, using orjson when it is installed.
+
+    Falls back to stdlib json for values orjson cannot encode.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj).encode('utf-8')
+
 
 def get_past_week_dates():
     """Generate list of dates for the past 7 days (including today)."""
     today = datetime.now().date()
-    return [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)]
+    return [(today - timedelta(days=i)).isoformat() for i in range(7)]
 
 
 def format_syslog_date(date_obj):
     """Format date in BSD syslog style: 'Mon DD' with space-padded day."""
-    month = date_obj.strftime("%b")
-    day = date_obj.day
-    return f"{month} {day:2d}"
+    return f"{_MONTHS[date_obj.month - 1]} {date_obj.day:2d}"
 
 
-def distribute_dates(num_items, dates):
-    """Distribute dates across items to spread events over 7 days."""
-    if num_items == 0:
-        return []
-    return [dates[(i * len(dates)) // num_items] for i in range(num_items)]
+def build_template_vars(date_str, today):
+    """Build the Jinja2 template variables for a YYYY-MM-DD date string."""
+    d = date.fromisoformat(date_str)
+    return {
+        'date': date_str,
+        'date_us': f"{d.month:02d}/{d.day:02d}/{d.year:04d}",
+        'date_eu': f"{d.day:02d}/{d.month:02d}/{d.year:04d}",
+        'date_short': f"{d.year:04d}{d.month:02d}{d.day:02d}",
+        'syslog_date': format_syslog_date(d),
+        'day_offset': (today - d).days,
+    }
 
 
-def render_template_in_value(value, template_vars, env):
-    """Recursively render Jinja2 templates in JSON values."""
+def build_render_plan(value, path=(), plan=None):
+    """
+    Walk a JSON value once and record where Jinja2 templates live.
+
+    Returns a list of (path, template_string) tuples, where path is the tuple
+    of dict keys / list indexes leading to the templated string.
+    """
+    if plan is None:
+        plan = []
     if isinstance(value, str):
         if '{{' in value and '}}' in value:
-            try:
-                template = env.from_string(value)
-                return template.render(**template_vars)
-            except Exception:
-                return value
-        return value
+            plan.append((path, value))
     elif isinstance(value, dict):
-        return {k: render_template_in_value(v, template_vars, env) for k, v in value.items()}
+        for k, v in value.items():
+            build_render_plan(v, path + (k,), plan)
     elif isinstance(value, list):
-        return [render_template_in_value(item, template_vars, env) for item in value]
-    else:
-        return value
+        for i, item in enumerate(value):
+            build_render_plan(item, path + (i,), plan)
+    return plan
+
+
+def _set_at(obj, path, value):
+    """Replace the value found at path inside nested dicts/lists."""
+    for key in path[:-1]:
+        obj = obj[key]
+    obj[path[-1]] = value
+
+
+def compile_template(source, env, var_names):
+    """
+    Compile a template string into a callable taking the template vars.
+
+    Strings made only of plain ``{{ name }}`` substitutions of known
+    variables become a str.format_map call, skipping Jinja2 entirely.
+    Anything else (filters, tags, expressions) is compiled with Jinja2.
+    """
+    parts = _SIMPLE_VAR_RE.split(source)
+    literals, names = parts[::2], parts[1::2]
+    is_simple = (
+        '\r' not in source
+        and all(name in var_names for name in names)
+        and not any('{{' in p or '{%' in p or '{#' in p for p in literals)
+        # A '{' right before a placeholder lexes differently in Jinja2 ('{{{')
+        and not any(p.endswith('{') for p in literals[:-1])
+    )
+    if not is_simple:
+        return lambda template_vars, t=env.from_string(source): t.render(**template_vars)
+
+    # Jinja2 drops a single trailing newline; match that
+    if literals[-1].endswith('\n'):
+        literals[-1] = literals[-1][:-1]
+    fmt = literals[0].replace('{', '{{').replace('}', '}}')
+    for name, literal in zip(names, literals[1:]):
+        fmt += '{' + name + '}' + literal.replace('{', '{{').replace('}', '}}')
+    return fmt.format_map
+
+
+def render_event(event, plan, template_vars, env, compiled):
+    """
+    Render the templated strings listed in plan, updating event in place.
+
+    Compiled templates are memoized in ``compiled`` (keyed on the source
+    string) so identical strings across events are only compiled once.
+    Strings that fail to render are left unchanged.
+    """
+    for path, source in plan:
+        try:
+            render = compiled.get(source)
+            if render is None:
+                render = compile_template(source, env, template_vars)
+                compiled[source] = render
+            rendered = render(template_vars)
+        except Exception:
+            continue
+        if not path:
+            return rendered
+        _set_at(event, path, rendered)
+    return event
 
 
 def fetch_template(url):
-    """Fetch template content from a URL."""
-    with urlopen(url, timeout=30) as response:
-        return response.read().decode('utf-8')
+    """
+    Fetch template content from a URL.
+
+    Responses are cached per URL; later fetches send If-None-Match /
+    If-Modified-Since and reuse the cached body on 304 Not Modified.
+    """
+    headers = {'User-Agent': 'LC-DemoDataLoader/1.0'}
+    cached = _TEMPLATE_CACHE.get(url)
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    response = _session.get(url, headers=headers, timeout=30)
+    if response.status_code == 304 and cached:
+        return cached[2]
+    response.raise_for_status()
+
+    body = response.content.decode('utf-8')
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if etag or last_modified:
+        _TEMPLATE_CACHE[url] = (etag, last_modified, body)
+    return body
 
 
 def process_json_template(template_content):
     """Process a JSON array template, filling in dates spread over 7 days."""
-    events = json.loads(template_content.strip())
+    events = _loads(template_content)
 
     if not isinstance(events, list):
         raise ValueError("JSON template must be an array of events")
 
+    # One scan of the raw document: nothing to render without placeholders
+    if '{{' not in template_content:
+        return events
+
+    today = datetime.now().date()
     dates = get_past_week_dates()
-    date_assignments = distribute_dates(len(events), dates)
-    env = Environment(loader=BaseLoader())
+    vars_by_date = [build_template_vars(d, today) for d in dates]
+    compiled = {}
 
+    # Spread events evenly over the dates, in order
+    num_events = len(events)
+    num_dates = len(dates)
     processed_events = []
-    for event, assigned_date in zip(events, date_assignments):
-        date_obj = datetime.strptime(assigned_date, "%Y-%m-%d")
-        days_ago = (datetime.now().date() - date_obj.date()).days
-
-        template_vars = {
-            'date': assigned_date,
-            'date_us': date_obj.strftime("%m/%d/%Y"),
-            'date_eu': date_obj.strftime("%d/%m/%Y"),
-            'date_short': date_obj.strftime("%Y%m%d"),
-            'syslog_date': format_syslog_date(date_obj),
-            'day_offset': days_ago,
-        }
-
-        processed_event = render_template_in_value(event, template_vars, env)
+    for i, event in enumerate(events):
+        template_vars = vars_by_date[(i * num_dates) // num_events]
+        plan = build_render_plan(event)
+        processed_event = render_event(event, plan, template_vars, _JINJA_ENV, compiled)
         processed_events.append(processed_event)
 
     return processed_events
 
 
-def send_events_to_webhook(webhook_url, events, delay=0.05):
-    """Send events to webhook as flat JSON objects."""
+class TokenBucket:
+    """
+    Token-bucket rate limiter.
+
+    acquire() returns immediately while tokens are available and only sleeps
+    for the exact deficit once the burst capacity is spent. A rate of 0 or
+    less disables limiting. Not thread-safe; call from a single thread.
+    """
+
+    def __init__(self, rate_per_sec, capacity=5):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            time.sleep((1 - self.tokens) / self.rate)
+            self.tokens = 1
+            self.updated = time.monotonic()
+        self.tokens -= 1
+
+
+def _send_payload(webhook_url, json_data):
+    """POST a serialized JSON body. Returns None on success, else an error string."""
+    try:
+        response = _session.post(
+            webhook_url,
+            data=json_data,
+            headers={
+                'Content-Type': 'application/json',
+                'User-Agent': 'LC-DemoDataLoader/1.0'
+            },
+            timeout=30
+        )
+        if 200 <= response.status_code < 300:
+            return None
+        return f"HTTP {response.status_code}"
+    except requests.RequestException as e:
+        return str(e)
+    except Exception as e:
+        return str(e)
+
+
+def send_events_to_webhook(webhook_url, events, rate=20, concurrency=10, batch_size=1):
+    """
+    Send events to webhook, up to `concurrency` requests in flight (capped
+    at MAX_CONCURRENCY, the size of the keep-alive pool).
+
+    Requests are paced by a token bucket allowing `rate` requests per second
+    (0 for unlimited) with short bursts.
+
+    With the default batch_size of 1 each event is sent as a flat JSON object,
+    which D&R rules need to match on event/FIELD_NAME paths. A larger
+    batch_size sends JSON arrays of up to that many events per request, for
+    receivers that unpack batched payloads.
+    """
     successful = 0
     failed = 0
     errors = []
-
-    for i, event in enumerate(events):
+    batch_size = max(1, batch_size)
+
+    # Serialize everything up front so the send loop is pure network I/O
+    bodies = []
+    for start in range(0, len(events), batch_size):
+        if batch_size == 1:
+            payload = events[start]
+        else:
+            payload = events[start:start + batch_size]
+        count = min(batch_size, len(events) - start)
         try:
-            json_data = json.dumps(event).encode('utf-8')
-            request = Request(
-                webhook_url,
-                data=json_data,
-                headers={
-                    'Content-Type': 'application/json',
-                    'User-Agent': 'LC-DemoDataLoader/1.0'
-                },
-                method='POST'
-            )
-
-            with urlopen(request, timeout=30) as response:
-                if 200 <= response.getcode() < 300:
-                    successful += 1
-                else:
-                    failed += 1
-                    errors.append(f"Event {i+1}: HTTP {response.getcode()}")
-
-        except (HTTPError, URLError) as e:
-            failed += 1
-            errors.append(f"Event {i+1}: {str(e)}")
+            bodies.append((start, count, _dumps(payload)))
         except Exception as e:
-            failed += 1
-            errors.append(f"Event {i+1}: {str(e)}")
-
-        if delay > 0:
-            time.sleep(delay)
+            failed += count
+            errors.append(f"Event {start+1}: Serialization failed: {str(e)}")
+
+    bucket = TokenBucket(rate)
+    concurrency = min(max(1, concurrency), MAX_CONCURRENCY)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = []
+        for start, count, json_data in bodies:
+            bucket.acquire()
+            futures.append((start, count, executor.submit(_send_payload, webhook_url, json_data)))
+
+        for start, count, future in futures:
+            error = future.result()
+            if error is None:
+                successful += count
+            else:
+                failed += count
+                if count == 1:
+                    errors.append(f"Event {start+1}: {error}")
+                else:
+                    errors.append(f"Events {start+1}-{start+count}: {error}")
 
     return successful, failed, errors
 
@@ -152,7 +370,13 @@ def playbook(sdk, data):
             - data.data.template_url: URL to fetch JSON event template from
             - data.data.webhook_url: Webhook URL to send events to
             - data.data.webhook: Optional hive reference like "hive://secret/webhook-secret"
-            - data.data.delay: Optional delay between events in seconds (default: 0.05)
+            - data.data.rate: Optional max requests per second, 0 for unlimited (default: 20)
+            - data.data.delay: Deprecated; seconds between requests, used as 1/delay
+              when rate is not given
+            - data.data.concurrency: Optional number of requests in flight at once
+              (default and maximum: 10)
+            - data.data.batch_size: Optional events per request; values above 1 send
+              JSON arrays instead of flat events (default: 1)
 
     Returns:
         Dictionary with 'data' (success info) or 'error' (failure message)
@@ -168,7 +392,7 @@ def playbook(sdk, data):
     params = data.get('data', data)  # Fall back to data itself if no nested data
     if isinstance(params, str):
         try:
-            params = json.loads(params)
+            params = _loads(params)
         except:
             return {"error": "Data is string but not valid JSON"}
 
@@ -201,7 +425,12 @@ def playbook(sdk, data):
         except Exception as e:
             return {"error": f"Failed to resolve webhook from hive: {str(e)}"}
 
-    delay = params.get('delay', 0.05)
+    rate = params.get('rate')
+    if rate is None:
+        delay = params.get('delay', 0.05)
+        rate = 1 / delay if delay > 0 else 0
+    concurrency = params.get('concurrency', 10)
+    batch_size = params.get('batch_size', 1)
 
     try:
         # Fetch template
@@ -211,7 +440,9 @@ def playbook(sdk, data):
         events = process_json_template(template_content)
 
         # Send to webhook
-        successful, failed, errors = send_events_to_webhook(webhook_url, events, delay)
+        successful, failed, errors = send_events_to_webhook(
+            webhook_url, events, rate, concurrency, batch_size
+        )
 
         result = {
             "status": "success" if failed == 0 else "partial",
@@ -236,7 +467,7 @@ def playbook(sdk, data):
 
     except json.JSONDecodeError as e:
         return {"error": f"Invalid JSON in template: {str(e)}"}
-    except (HTTPError, URLError) as e:
+    except requests.RequestException as e:
         return {"error": f"Failed to fetch template: {str(e)}"}
     except Exception as e:
         return {"error": f"Playbook execution failed: {str(e)}"}
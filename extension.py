@@ -15,7 +15,10 @@ Environment Variables:
 
 import os
 import hashlib
+import types
 import yaml
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Any, Optional
 
 from lcextension import Extension
@@ -29,7 +32,7 @@ from lcextension.schema import (
 
 # Import core functions from the existing template processor
 from log_template_processor import (
-    fetch_template,
+    fetch_template_bytes,
     process_template,
     send_json_events_to_webhook,
 )
@@ -39,11 +42,14 @@ EXTENSION_NAME = "ext-demo-data"
 WEBHOOK_NAME = "demo-data-webhook"
 DR_RULE_PREFIX = "demo-"
 
+# Max concurrent D&R rule API calls during subscribe/unsubscribe
+RULE_API_WORKERS = 10
+
 # Default template URL (hosted on GitHub)
 DEFAULT_TEMPLATE_URL = "https://raw.githubusercontent.com/lc-cbot/demo-data-extension/main/lc_events_simple_template.json"
 
 # D&R Rules to deploy (embedded for reliability)
-DR_RULES = [
+_DR_RULES = [
     {
         "name": "demo-encoded-powershell",
         "detect": {
@@ -165,13 +171,24 @@ DR_RULES = [
     },
 ]
 
+# Read-only view of the rules, shared by every handler
+DR_RULES = tuple(types.MappingProxyType(rule) for rule in _DR_RULES)
+
+# (name, payload) pairs in the shape sdk.rules().set() expects
+DR_RULE_PAYLOADS = tuple(
+    (rule["name"], {"detect": rule["detect"], "respond": rule["respond"]})
+    for rule in DR_RULES
+)
+
 
+@lru_cache(maxsize=1024)
 def generate_webhook_secret(oid: str) -> str:
     """Generate a deterministic webhook secret based on OID."""
     secret_base = f"{EXTENSION_NAME}-webhook-secret:{oid}"
     return hashlib.sha256(secret_base.encode()).hexdigest()[:32]
 
 
+@lru_cache(maxsize=1024)
 def get_webhook_url(oid: str, hook_domain: str) -> str:
     """Construct the full webhook URL for an organization."""
     secret = generate_webhook_secret(oid)
@@ -188,6 +205,9 @@ class DemoDataExtension(Extension):
 
         super().__init__(EXTENSION_NAME, secret)
 
+        # Hook domains per OID; static per org, so looked up once
+        self._hook_domain_cache: Dict[str, str] = {}
+
         # Register event handlers
         self.eventHandlers["subscribe"] = self._on_subscribe
         self.eventHandlers["unsubscribe"] = self._on_unsubscribe
@@ -248,6 +268,24 @@ class DemoDataExtension(Extension):
             "required_events": ["subscribe", "unsubscribe"],
         }
 
+    def _hook_domain(self, sdk) -> str:
+        """Get the org's webhook domain, caching it per OID."""
+        oid = sdk._oid
+        hook_domain = self._hook_domain_cache.get(oid)
+        if hook_domain is None:
+            hook_domain = sdk._lc._api.getHookDomain()
+            self._hook_domain_cache[oid] = hook_domain
+        return hook_domain
+
+    def _webhook_sensor_exists(self, sdk) -> bool:
+        """Check for the webhook sensor, letting the API filter by hostname."""
+        try:
+            sensors = sdk.sensors(selector=f'hostname == "{WEBHOOK_NAME}"')
+            return next(iter(sensors), None) is not None
+        except Exception:
+            # SDK or API without selector support: scan all sensors
+            return any(sensor.get("hostname") == WEBHOOK_NAME for sensor in sdk.sensors())
+
     def _on_subscribe(self, sdk, data: Dict, conf: Dict) -> Dict[str, Any]:
         """Handle organization subscription."""
         oid = sdk._oid
@@ -277,27 +315,33 @@ class DemoDataExtension(Extension):
                     results["errors"].append(f"Webhook creation failed: {str(e)}")
 
             # Step 2: Deploy D&R rules
-            for rule in DR_RULES:
-                try:
-                    sdk.rules().set(
-                        rule["name"],
-                        {
-                            "detect": rule["detect"],
-                            "respond": rule["respond"],
-                        },
+            # Each rule is an independent API call, so issue them concurrently
+            rules_api = sdk.rules()
+            with ThreadPoolExecutor(max_workers=RULE_API_WORKERS) as executor:
+                futures = {
+                    executor.submit(
+                        rules_api.set,
+                        name,
+                        payload,
                         namespace="managed",
                         tags=["demo-data-extension"],
-                    )
-                    results["rules_deployed"] += 1
-                except Exception as e:
-                    results["errors"].append(f"Rule {rule['name']} failed: {str(e)}")
+                    ): name
+                    for name, payload in DR_RULE_PAYLOADS
+                }
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        future.result()
+                        results["rules_deployed"] += 1
+                    except Exception as e:
+                        results["errors"].append(f"Rule {name} failed: {str(e)}")
 
             # Step 3: Auto-load demo data if configured
             auto_load = conf.get("auto_load_on_subscribe", True)
             if auto_load and results["webhook_created"]:
                 try:
                     template_url = conf.get("template_url", DEFAULT_TEMPLATE_URL)
-                    hook_domain = sdk._lc._api.getHookDomain()
+                    hook_domain = self._hook_domain(sdk)
                     webhook_url = get_webhook_url(oid, hook_domain)
 
                     load_result = self._do_load_demo_data(template_url, webhook_url)
@@ -333,19 +377,28 @@ class DemoDataExtension(Extension):
                     results["errors"].append(f"Webhook deletion failed: {str(e)}")
 
             # Step 2: Delete D&R rules
-            for rule in DR_RULES:
-                try:
-                    sdk.rules().delete(rule["name"], namespace="managed")
-                    results["rules_deleted"] += 1
-                except Exception as e:
-                    if "not found" in str(e).lower():
+            rules_api = sdk.rules()
+            with ThreadPoolExecutor(max_workers=RULE_API_WORKERS) as executor:
+                futures = {
+                    executor.submit(rules_api.delete, rule["name"], namespace="managed"): rule
+                    for rule in DR_RULES
+                }
+                for future in as_completed(futures):
+                    rule = futures[future]
+                    try:
+                        future.result()
                         results["rules_deleted"] += 1
-                    else:
-                        results["errors"].append(f"Rule {rule['name']} deletion failed: {str(e)}")
+                    except Exception as e:
+                        if "not found" in str(e).lower():
+                            results["rules_deleted"] += 1
+                        else:
+                            results["errors"].append(f"Rule {rule['name']} deletion failed: {str(e)}")
 
         except Exception as e:
             results["errors"].append(f"Unsubscription handler error: {str(e)}")
 
+        self._hook_domain_cache.pop(sdk._oid, None)
+
         return {"data": results}
 
     def _load_demo_data(self, sdk, data: Dict, conf: Dict) -> Dict[str, Any]:
@@ -357,7 +410,7 @@ class DemoDataExtension(Extension):
 
         try:
             # Get webhook URL
-            hook_domain = sdk._lc._api.getHookDomain()
+            hook_domain = self._hook_domain(sdk)
             webhook_url = get_webhook_url(oid, hook_domain)
 
             # Load the demo data
@@ -370,7 +423,7 @@ class DemoDataExtension(Extension):
     def _do_load_demo_data(self, template_url: str, webhook_url: str) -> Dict[str, Any]:
         """Internal method to load demo data."""
         # Fetch and process the template
-        template_content = fetch_template(template_url)
+        template_content = fetch_template_bytes(template_url)
         events = process_template(template_content)
 
         if not isinstance(events, list):
@@ -392,7 +445,7 @@ class DemoDataExtension(Extension):
         oid = sdk._oid
 
         try:
-            hook_domain = sdk._lc._api.getHookDomain()
+            hook_domain = self._hook_domain(sdk)
             webhook_url = get_webhook_url(oid, hook_domain)
 
             return {
@@ -418,11 +471,7 @@ class DemoDataExtension(Extension):
         try:
             # Check webhook
             try:
-                sensors = sdk.sensors()
-                for sensor in sensors:
-                    if sensor.get("hostname") == WEBHOOK_NAME:
-                        status["webhook_exists"] = True
-                        break
+                status["webhook_exists"] = self._webhook_sensor_exists(sdk)
             except Exception:
                 pass
 
@@ -431,17 +480,15 @@ class DemoDataExtension(Extension):
                 existing_rules = sdk.rules().get(namespace="managed")
                 existing_names = set(existing_rules.keys()) if existing_rules else set()
 
-                for rule in DR_RULES:
-                    if rule["name"] in existing_names:
-                        status["rules_deployed"].append(rule["name"])
-                    else:
-                        status["rules_missing"].append(rule["name"])
+                # Set lookups for membership; results keep DR_RULES order
+                status["rules_deployed"] = [n for n, _ in DR_RULE_PAYLOADS if n in existing_names]
+                status["rules_missing"] = [n for n, _ in DR_RULE_PAYLOADS if n not in existing_names]
             except Exception as e:
                 status["rules_error"] = str(e)
 
             # Add webhook URL
             try:
-                hook_domain = sdk._lc._api.getHookDomain()
+                hook_domain = self._hook_domain(sdk)
                 status["webhook_url"] = get_webhook_url(oid, hook_domain)
             except Exception:
                 pass
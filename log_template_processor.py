@@ -36,29 +36,207 @@ Supported template variables:
     {{ day_offset }}   - Number of days ago (0-6)
 """
 
+import os
+import re
 import sys
+import multiprocessing
+import copy
+import gzip
 import json
 import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 from datetime import datetime, timedelta
-from urllib.request import urlopen, Request
-from urllib.error import URLError, HTTPError
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from jinja2 import Environment, BaseLoader
 
+try:
+    import orjson
+except ImportError:
+    # Optional C-accelerated JSON; stdlib json is used when it is missing
+    orjson = None
+
+# Upper bound on concurrent webhook requests from send_json_events_to_webhook
+MAX_WEBHOOK_WORKERS = 32
+
+# Keep-alive connection pool shared by the webhook senders; sized so every
+# send_json_events_to_webhook worker thread can hold its own connection
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=MAX_WEBHOOK_WORKERS,
+    max_retries=Retry(total=2, backoff_factor=0.1),
+)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+# Fetched templates by URL: url -> (etag, last_modified, body), most recently
+# used last. Lets repeat fetches revalidate with a conditional GET.
+_TEMPLATE_CACHE = OrderedDict()
+_TEMPLATE_CACHE_SIZE = 32
+_template_cache_lock = threading.Lock()
+
+# Shared Jinja2 environment for templates that need more than plain substitution
+_ENV = Environment(loader=BaseLoader(), auto_reload=False)
+
+# Variables provided by build_template_vars()
+_TEMPLATE_VAR_NAMES = frozenset({
+    'date', 'date_us', 'date_eu', 'date_short', 'syslog_date', 'day_offset',
+})
+
+# Plain {{ name }} substitution, with no filters, tags or expressions
+_SIMPLE_VAR_RE = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+
+def _simple_format(source):
+    """
+    Convert a string of plain ``{{ name }}`` placeholders into a format string.
+
+    Returns None if the string uses anything else (filters, tags, comments,
+    expressions) or names an unknown variable, so Jinja2 must render it.
+    """
+    parts = _SIMPLE_VAR_RE.split(source)
+    literals, names = parts[::2], parts[1::2]
+    if '\r' in source or not _TEMPLATE_VAR_NAMES.issuperset(names):
+        return None
+    if any('{{' in p or '{%' in p or '{#' in p for p in literals):
+        return None
+    # A '{' right before a placeholder lexes differently in Jinja2 ('{{{')
+    if any(p.endswith('{') for p in literals[:-1]):
+        return None
+
+    # Jinja2 drops a single trailing newline; match that
+    if literals[-1].endswith('\n'):
+        literals[-1] = literals[-1][:-1]
+    fmt = literals[0].replace('{', '{{').replace('}', '}}')
+    for name, literal in zip(names, literals[1:]):
+        fmt += '{' + name + '}' + literal.replace('{', '{{').replace('}', '}}')
+    return fmt
+
+
+@lru_cache(maxsize=4096)
+def _compile(source):
+    """
+    Compile a template string once into a render callable taking the vars dict.
+
+    Plain ``{{ name }}`` substitutions become a str.format_map call, skipping
+    Jinja2's render machinery; anything else is compiled with Jinja2.
+    Repeated log shapes reuse the cached result.
+    """
+    fmt = _simple_format(source)
+    if fmt is not None:
+        return fmt.format_map
+    return _ENV.from_string(source).render
+
+
+# First non-whitespace character is '[' (checked without copying the content)
+_JSON_ARRAY_START = re.compile(r'\s*\[')
+_JSON_ARRAY_START_BYTES = re.compile(rb'\s*\[')
+
+
+def _needs_jinja(line):
+    """Whether a line has Jinja2 markup (or a CR, which Jinja2 normalizes)."""
+    return '{{' in line or '{%' in line or '{#' in line or '\r' in line
+
+
+def _json_loads(data):
+    """
+    Parse JSON text or bytes, using orjson when it is installed.
+
+    Documents orjson rejects but stdlib json accepts (NaN, Infinity,
+    out-of-range floats) are parsed with json instead. orjson does parse
+    integers beyond 64 bits, but as floats, so templates needing exact large
+    integers should quote them as strings.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def _json_dumps(obj):
+    """
+    Serialize obj to compact JSON bytes, using orjson when it is installed.
+
+    Falls back to stdlib json for values orjson cannot encode, such as
+    integers beyond 64 bits.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj).encode('utf-8')
+
 
 def is_url(source):
     """Check if the source is a URL."""
     return source.startswith('http://') or source.startswith('https://')
 
 
-def fetch_template(source):
+def _fetch_url_cached(url):
     """
-    Fetch template content from a URL or local file.
+    GET url, revalidating against the in-process template cache.
+
+    Sends If-None-Match / If-Modified-Since when the URL was fetched before
+    and returns the cached body on 304. Responses marked Cache-Control:
+    no-store are neither cached nor revalidated.
+
+    Raises:
+        requests.RequestException on network or HTTP errors
+    """
+    headers = {}
+    with _template_cache_lock:
+        cached = _TEMPLATE_CACHE.get(url)
+    if cached:
+        etag, last_modified, _ = cached
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    response = _session.get(url, headers=headers, timeout=30)
+    if response.status_code == 304 and cached:
+        with _template_cache_lock:
+            if url in _TEMPLATE_CACHE:
+                _TEMPLATE_CACHE.move_to_end(url)
+        return cached[2]
+    response.raise_for_status()
+
+    body = response.content
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    no_store = 'no-store' in response.headers.get('Cache-Control', '').lower()
+    with _template_cache_lock:
+        if no_store or not (etag or last_modified):
+            _TEMPLATE_CACHE.pop(url, None)
+        else:
+            _TEMPLATE_CACHE[url] = (etag, last_modified, body)
+            _TEMPLATE_CACHE.move_to_end(url)
+            while len(_TEMPLATE_CACHE) > _TEMPLATE_CACHE_SIZE:
+                _TEMPLATE_CACHE.popitem(last=False)
+    return body
+
+
+def fetch_template_bytes(source):
+    """
+    Fetch raw template bytes from a URL or local file.
+
+    JSON array templates can be handed straight to process_template, which
+    parses them from bytes without first building a decoded copy.
 
     Args:
         source: URL or local file path
 
     Returns:
-        Template content as string
+        Template content as bytes
 
     Raises:
         SystemExit on error
@@ -66,22 +244,21 @@ def fetch_template(source):
     if is_url(source):
         try:
             print(f"Fetching template from URL: {source}", file=sys.stderr)
-            with urlopen(source, timeout=30) as response:
-                content = response.read().decode('utf-8')
+            content = _fetch_url_cached(source)
             print(f"Successfully fetched {len(content)} bytes", file=sys.stderr)
             return content
-        except HTTPError as e:
-            print(f"Error: HTTP {e.code} when fetching URL: {source}", file=sys.stderr)
+        except requests.HTTPError as e:
+            print(f"Error: HTTP {e.response.status_code} when fetching URL: {source}", file=sys.stderr)
             sys.exit(1)
-        except URLError as e:
-            print(f"Error: Failed to fetch URL: {e.reason}", file=sys.stderr)
+        except requests.RequestException as e:
+            print(f"Error: Failed to fetch URL: {e}", file=sys.stderr)
             sys.exit(1)
         except Exception as e:
             print(f"Error fetching URL: {e}", file=sys.stderr)
             sys.exit(1)
     else:
         try:
-            with open(source, 'r') as f:
+            with open(source, 'rb') as f:
                 return f.read()
         except FileNotFoundError:
             print(f"Error: Template file '{source}' not found.", file=sys.stderr)
@@ -91,6 +268,22 @@ def fetch_template(source):
             sys.exit(1)
 
 
+def fetch_template(source):
+    """
+    Fetch template content from a URL or local file.
+
+    Args:
+        source: URL or local file path
+
+    Returns:
+        Template content as string
+
+    Raises:
+        SystemExit on error
+    """
+    return fetch_template_bytes(source).decode('utf-8')
+
+
 def send_to_webhook(webhook_url, log_lines, batch_size=10, delay_between_batches=0.1):
     """
     Send log lines to a webhook URL as JSON POST requests.
@@ -122,32 +315,28 @@ def send_to_webhook(webhook_url, log_lines, batch_size=10, delay_between_batches
         }
 
         try:
-            json_data = json.dumps(payload).encode('utf-8')
-            request = Request(
+            json_data = _json_dumps(payload)
+            response = _session.post(
                 webhook_url,
                 data=json_data,
                 headers={
                     'Content-Type': 'application/json',
                     'User-Agent': 'LogTemplateProcessor/1.0'
                 },
-                method='POST'
+                timeout=30
             )
 
-            with urlopen(request, timeout=30) as response:
-                status = response.getcode()
-                if 200 <= status < 300:
-                    successful += len(batch)
-                    print(f"  Batch {batch_num}/{total_batches}: Sent {len(batch)} events (HTTP {status})", file=sys.stderr)
-                else:
-                    failed += len(batch)
-                    print(f"  Batch {batch_num}/{total_batches}: Failed with HTTP {status}", file=sys.stderr)
+            status = response.status_code
+            if 200 <= status < 300:
+                successful += len(batch)
+                print(f"  Batch {batch_num}/{total_batches}: Sent {len(batch)} events (HTTP {status})", file=sys.stderr)
+            else:
+                failed += len(batch)
+                print(f"  Batch {batch_num}/{total_batches}: Failed with HTTP {status}", file=sys.stderr)
 
-        except HTTPError as e:
+        except requests.RequestException as e:
             failed += len(batch)
-            print(f"  Batch {batch_num}/{total_batches}: HTTP error {e.code}: {e.reason}", file=sys.stderr)
-        except URLError as e:
-            failed += len(batch)
-            print(f"  Batch {batch_num}/{total_batches}: URL error: {e.reason}", file=sys.stderr)
+            print(f"  Batch {batch_num}/{total_batches}: Request error: {e}", file=sys.stderr)
         except Exception as e:
             failed += len(batch)
             print(f"  Batch {batch_num}/{total_batches}: Error: {e}", file=sys.stderr)
@@ -177,102 +366,301 @@ def format_syslog_date(date_obj):
     return f"{month} {day:2d}"
 
 
+def build_template_vars(date_str, today):
+    """
+    Build the template variables for a YYYY-MM-DD date string.
+
+    Computed once per distinct date (at most 7) rather than per line/event.
+    """
+    date_obj = datetime.strptime(date_str, "%Y-%m-%d")
+    return {
+        'date': date_str,
+        'date_us': date_obj.strftime("%m/%d/%Y"),
+        'date_eu': date_obj.strftime("%d/%m/%Y"),
+        'date_short': date_obj.strftime("%Y%m%d"),
+        'syslog_date': format_syslog_date(date_obj),
+        'day_offset': (today - date_obj.date()).days,
+    }
+
+
+def _iter_nonblank_lines(template_content, with_index=False):
+    """
+    Yield the non-blank lines of template content in a single pass.
+
+    Lines are split on '\n' only; a trailing '\r' is left for rendering to
+    normalize, and other characters str.splitlines() treats as breaks stay
+    inside the line. With with_index, yields (line, line_index) tuples.
+    """
+    for idx, line in enumerate(template_content.strip().split('\n')):
+        if line.strip():
+            yield (line, idx) if with_index else line
+
+
 def parse_template_lines(template_content):
     """
     Parse template content and identify lines with date placeholders.
     Returns list of (line, line_index) tuples.
     """
-    lines = template_content.strip().split('\n')
-    return [(line, idx) for idx, line in enumerate(lines) if line.strip()]
+    return list(_iter_nonblank_lines(template_content, with_index=True))
 
 
-def distribute_dates(num_lines, dates):
+def distribute_day_offsets(num_lines, num_days=7):
     """
-    Distribute dates across log lines to spread events over 7 days.
-    Returns a list of date strings, one per line.
+    Distribute log lines across days to spread events over the past week.
+    Returns a list of day offsets (0 = today), one per line, which index
+    directly into get_past_week_dates() and its per-date template vars.
     """
     if num_lines == 0:
         return []
 
-    # Distribute lines across available dates
-    date_assignments = []
-    for i in range(num_lines):
-        # Map line index to a date index (spreads evenly)
-        date_idx = (i * len(dates)) // num_lines
-        date_assignments.append(dates[date_idx])
+    # Line i gets day (i * num_days) // num_lines, so each day covers one
+    # contiguous run of lines: [ceil(d * N / D), ceil((d + 1) * N / D)).
+    # Build the list run by run instead of computing an offset per line.
+    day_offsets = []
+    for offset in range(num_days):
+        start = -(-offset * num_lines // num_days)
+        stop = -(-(offset + 1) * num_lines // num_days)
+        day_offsets.extend([offset] * (stop - start))
 
-    return date_assignments
+    return day_offsets
 
 
-def is_json_array(content):
-    """Check if the content is a JSON array."""
-    stripped = content.strip()
-    if not stripped.startswith('['):
-        return False
+def parse_json_array(content):
+    """
+    Parse content as a JSON array.
+
+    content may be str or bytes. Returns the parsed list, or None if the
+    content is not a JSON array. A cheap leading-'[' check runs before any
+    parsing.
+    """
+    pattern = _JSON_ARRAY_START_BYTES if isinstance(content, bytes) else _JSON_ARRAY_START
+    if not pattern.match(content):
+        return None
     try:
-        json.loads(stripped)
-        return True
+        return _json_loads(content)
     except json.JSONDecodeError:
-        return False
+        return None
 
 
-def render_template_in_value(value, template_vars, env):
-    """Recursively render Jinja2 templates in JSON values."""
-    if isinstance(value, str):
-        if '{{' in value and '}}' in value:
+def is_json_array(content):
+    """Check if the content is a JSON array."""
+    return parse_json_array(content) is not None
+
+
+def _render_string(value, template_vars):
+    """Render a string value if it contains a placeholder, else return it unchanged."""
+    if '{{' in value and '}}' in value:
+        try:
+            render = _compile(value)
+            return render(template_vars)
+        except Exception:
+            return value
+    return value
+
+
+def _template_slots(container, slots=None):
+    """
+    Collect (parent, key) for every string containing '{{' inside a dict or list.
+
+    Walks with an explicit stack of containers instead of recursing; other
+    scalars are skipped where they lie. Writing parent[key] replaces the value.
+    """
+    if slots is None:
+        slots = []
+    stack = [container]
+    while stack:
+        node = stack.pop()
+        items = node.items() if isinstance(node, dict) else enumerate(node)
+        for key, value in items:
+            if isinstance(value, str):
+                if '{{' in value:
+                    slots.append((node, key))
+            elif isinstance(value, (dict, list)):
+                stack.append(value)
+    return slots
+
+
+def render_template_in_value(value, template_vars, env=None):
+    """
+    Render Jinja2 templates in a JSON value, returning a new value.
+
+    Public API for callers rendering their own values; the input is left
+    unmodified. process_json_template renders its freshly parsed events in
+    place instead and does not go through this. If env is given, templates
+    are rendered with that Jinja2 environment rather than the shared one.
+    """
+    def render(source):
+        if env is None:
+            return _render_string(source, template_vars)
+        if '{{' in source and '}}' in source:
             try:
-                template = env.from_string(value)
-                return template.render(**template_vars)
+                return env.from_string(source).render(**template_vars)
             except Exception:
-                return value
-        return value
-    elif isinstance(value, dict):
-        return {k: render_template_in_value(v, template_vars, env) for k, v in value.items()}
-    elif isinstance(value, list):
-        return [render_template_in_value(item, template_vars, env) for item in value]
-    else:
-        return value
+                return source
+        return source
+
+    if isinstance(value, str):
+        return render(value)
+    if isinstance(value, (dict, list)):
+        value = copy.deepcopy(value)
+        for parent, key in _template_slots(value):
+            parent[key] = render(parent[key])
+    return value
 
 
-def process_json_template(template_content):
+def process_json_template(template_content, parsed=None):
     """
     Process a JSON array template file.
 
     Each JSON object in the array is treated as a separate event.
     Template variables in string values are replaced with dates spread over 7 days.
+
+    If the caller has already parsed template_content, pass the result as
+    parsed to skip parsing it again; it is rendered in place and returned.
     """
-    try:
-        events = json.loads(template_content.strip())
-    except json.JSONDecodeError as e:
-        print(f"Error: Invalid JSON in template: {e}", file=sys.stderr)
-        sys.exit(1)
+    if parsed is not None:
+        events = parsed
+    else:
+        try:
+            events = _json_loads(template_content)
+        except json.JSONDecodeError as e:
+            print(f"Error: Invalid JSON in template: {e}", file=sys.stderr)
+            sys.exit(1)
 
     if not isinstance(events, list):
         print("Error: JSON template must be an array of events", file=sys.stderr)
         sys.exit(1)
 
+    # One scan of the raw document: nothing to render without placeholders
+    marker = b'{{' if isinstance(template_content, bytes) else '{{'
+    if marker not in template_content:
+        return events
+
+    today = datetime.now().date()
     dates = get_past_week_dates()
-    date_assignments = distribute_dates(len(events), dates)
-    env = Environment(loader=BaseLoader())
-
-    processed_events = []
-    for event, assigned_date in zip(events, date_assignments):
-        date_obj = datetime.strptime(assigned_date, "%Y-%m-%d")
-        days_ago = (datetime.now().date() - date_obj.date()).days
-
-        template_vars = {
-            'date': assigned_date,
-            'date_us': date_obj.strftime("%m/%d/%Y"),
-            'date_eu': date_obj.strftime("%d/%m/%Y"),
-            'date_short': date_obj.strftime("%Y%m%d"),
-            'syslog_date': format_syslog_date(date_obj),
-            'day_offset': days_ago,
-        }
+    day_offsets = distribute_day_offsets(len(events), len(dates))
+    vars_by_offset = [build_template_vars(d, today) for d in dates]
+
+    # Pre-walk: find every templated string and the day it renders for
+    slots = []
+    slot_offsets = []
+    for i, (event, offset) in enumerate(zip(events, day_offsets)):
+        start = len(slots)
+        if isinstance(event, (dict, list)):
+            _template_slots(event, slots)
+        elif isinstance(event, str) and '{{' in event:
+            slots.append((events, i))
+        slot_offsets.extend([offset] * (len(slots) - start))
+
+    # events was parsed for this call, so results are written back in place;
+    # _compile's cache compiles each distinct string once
+    for (parent, key), offset in zip(slots, slot_offsets):
+        parent[key] = _render_string(parent[key], vars_by_offset[offset])
+
+    return events
+
+
+# Opt-in process-parallel rendering for line templates: set RENDER_PROCESSES
+# above 1 to allow that many render processes (at most MAX_RENDER_PROCESSES,
+# and no more than the CPUs this process may run on). Only lines that need
+# full Jinja2 count towards PARALLEL_RENDER_MIN_LINES; plain {{ var }} lines
+# render through str.format_map far faster than a pool can start.
+PARALLEL_RENDER_MIN_LINES = 2000
+RENDER_CHUNK_LINES = 1024
+MAX_RENDER_PROCESSES = 4
+
+# multiprocessing context for the render pool, created on first use
+_mp_context = None
+
+
+def _render_processes():
+    """Render processes allowed by the RENDER_PROCESSES environment variable."""
+    try:
+        requested = int(os.environ.get('RENDER_PROCESSES', '1'))
+    except ValueError:
+        return 1
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    return max(1, min(requested, MAX_RENDER_PROCESSES, cpus))
+
+
+def _render_workers(lines):
+    """Number of render processes worth starting for these template lines."""
+    allowed = _render_processes()
+    if allowed <= 1 or len(lines) <= PARALLEL_RENDER_MIN_LINES:
+        return 1
+
+    # Distinct line shapes that Jinja2 itself has to render
+    jinja_shapes = {
+        line for line in dict.fromkeys(lines)
+        if _needs_jinja(line) and _simple_format(line) is None
+    }
+    if not jinja_shapes:
+        return 1
+    jinja_lines = sum(1 for line in lines if line in jinja_shapes)
+    if jinja_lines <= PARALLEL_RENDER_MIN_LINES:
+        return 1
 
-        processed_event = render_template_in_value(event, template_vars, env)
-        processed_events.append(processed_event)
+    chunks = -(-len(lines) // RENDER_CHUNK_LINES)
+    return min(allowed, chunks)
 
-    return processed_events
+
+def _render_context():
+    """
+    The forkserver context for the render pool, or None if unavailable.
+
+    forkserver rather than fork, since the web servers call in from threads;
+    preloading this module keeps per-pool worker startup to a fork. It is
+    set up lazily so importing this module changes no multiprocessing state.
+    """
+    global _mp_context
+    if _mp_context is None:
+        try:
+            ctx = multiprocessing.get_context('forkserver')
+        except ValueError:
+            # Not supported on this platform (e.g. Windows)
+            return None
+        ctx.set_forkserver_preload([__name__])
+        _mp_context = ctx
+    return _mp_context
+
+
+def _render_chunk(lines, day_offsets, vars_by_offset):
+    """
+    Render a run of template lines.
+
+    Module-level so process pool workers can run it; each worker keeps its
+    own _compile cache across the chunks it is given.
+    """
+    # Compile each distinct templated line once; most templates repeat a
+    # handful of line shapes many times
+    renderers = {}
+    for line in dict.fromkeys(lines):
+        # Lines without markup render to themselves; skip Jinja2 entirely
+        if not _needs_jinja(line):
+            continue
+        try:
+            renderers[line] = _compile(line)
+        except Exception as e:
+            # If template parsing fails, keep original line
+            print(f"Warning: Failed to process line: {e}", file=sys.stderr)
+
+    # Untemplated lines are already in place; only rendered ones are replaced
+    output_lines = lines[:]
+
+    for i, (line, offset) in enumerate(zip(lines, day_offsets)):
+        render = renderers.get(line)
+        if render is None:
+            continue
+
+        try:
+            output_lines[i] = render(vars_by_offset[offset])
+        except Exception as e:
+            print(f"Warning: Failed to process line: {e}", file=sys.stderr)
+
+    return output_lines
 
 
 def process_template(template_content):
@@ -287,61 +675,196 @@ def process_template(template_content):
     - {{ syslog_date }}: BSD syslog format (Mon DD with space-padded day)
     - {{ day_offset }}: Number of days ago (0-6)
 
-    Automatically detects JSON arrays vs line-based logs.
+    Automatically detects JSON arrays vs line-based logs. template_content
+    may be str or bytes (UTF-8); JSON arrays are parsed directly from bytes.
     """
-    # Check if this is a JSON array template
-    if is_json_array(template_content):
+    is_json, output = process_template_items(template_content)
+    if is_json:
+        return output
+    return '\n'.join(output)
+
+
+def process_template_items(template_content):
+    """
+    Process a template like process_template, also reporting its kind.
+
+    Returns (is_json, items): the rendered events for JSON array templates,
+    or the rendered lines, unjoined, for line-based logs. Callers that send
+    lines one by one can use them without re-splitting, but should skip
+    lines that rendered blank.
+    """
+    # Check if this is a JSON array template (parsed once, reused below)
+    events = parse_json_array(template_content)
+    if events is not None:
         print("Detected JSON array template", file=sys.stderr)
-        return process_json_template(template_content)
+        return True, process_json_template(template_content, parsed=events)
 
     # Line-based log processing
-    lines = [line for line in template_content.strip().split('\n') if line.strip()]
+    if isinstance(template_content, bytes):
+        template_content = template_content.decode('utf-8')
+    lines = list(_iter_nonblank_lines(template_content))
+    today = datetime.now().date()
     dates = get_past_week_dates()
-    date_assignments = distribute_dates(len(lines), dates)
+    day_offsets = distribute_day_offsets(len(lines), len(dates))
+    vars_by_offset = [build_template_vars(d, today) for d in dates]
 
-    env = Environment(loader=BaseLoader())
+    workers = _render_workers(lines)
+    ctx = _render_context() if workers > 1 else None
+    if ctx is not None:
+        try:
+            return False, _render_parallel(lines, day_offsets, vars_by_offset, workers, ctx)
+        except (OSError, BrokenProcessPool) as e:
+            print(f"Warning: Parallel rendering failed, rendering serially: {e}", file=sys.stderr)
+
+    return False, _render_chunk(lines, day_offsets, vars_by_offset)
+
+
+def _render_parallel(lines, day_offsets, vars_by_offset, workers, ctx):
+    """Render template lines in RENDER_CHUNK_LINES chunks on a process pool."""
     output_lines = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+        starts = range(0, len(lines), RENDER_CHUNK_LINES)
+        chunks = executor.map(
+            _render_chunk,
+            (lines[i:i + RENDER_CHUNK_LINES] for i in starts),
+            (day_offsets[i:i + RENDER_CHUNK_LINES] for i in starts),
+            (vars_by_offset for _ in starts),
+        )
+        for chunk in chunks:
+            output_lines.extend(chunk)
+    return output_lines
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter.
 
-    for line, assigned_date in zip(lines, date_assignments):
-        # Parse the assigned date
-        date_obj = datetime.strptime(assigned_date, "%Y-%m-%d")
-        days_ago = (datetime.now().date() - date_obj.date()).days
-
-        # Prepare template variables
-        template_vars = {
-            'date': assigned_date,
-            'date_us': date_obj.strftime("%m/%d/%Y"),
-            'date_eu': date_obj.strftime("%d/%m/%Y"),
-            'date_short': date_obj.strftime("%Y%m%d"),
-            'syslog_date': format_syslog_date(date_obj),
-            'day_offset': days_ago,
-        }
+    acquire() returns immediately while tokens are available and only sleeps
+    for the exact deficit once the burst capacity is spent. A rate of 0 or
+    less disables limiting. Not thread-safe; call from a single thread.
+    """
 
-        try:
-            template = env.from_string(line)
-            rendered = template.render(**template_vars)
-            output_lines.append(rendered)
-        except Exception as e:
-            # If template parsing fails, keep original line
-            print(f"Warning: Failed to process line: {e}", file=sys.stderr)
-            output_lines.append(line)
+    def __init__(self, rate_per_sec, capacity=5):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            time.sleep((1 - self.tokens) / self.rate)
+            self.tokens = 1
+            self.updated = time.monotonic()
+        self.tokens -= 1
+
+
+# Bodies at or below this size are sent uncompressed even with compress=True;
+# gzip's header and CPU cost outweigh the savings on small events
+GZIP_MIN_BYTES = 1024
+
+
+def _post_body(webhook_url, body, content_type, compress=False):
+    """
+    POST a prebuilt request body, gzip-encoded if compress is set and the
+    body is larger than GZIP_MIN_BYTES.
+
+    Returns None on success, or an error message on failure.
+    """
+    headers = {
+        'Content-Type': content_type,
+        'User-Agent': 'LogTemplateProcessor/1.0'
+    }
+    try:
+        if compress and len(body) > GZIP_MIN_BYTES:
+            # Level 1 is several times faster than the default and compresses
+            # repetitive JSON nearly as well
+            body = gzip.compress(body, compresslevel=1)
+            headers['Content-Encoding'] = 'gzip'
+
+        response = _session.post(
+            webhook_url,
+            data=body,
+            headers=headers,
+            timeout=30
+        )
+
+        status = response.status_code
+        if 200 <= status < 300:
+            return None
+        return f"Failed with HTTP {status}"
+
+    except requests.RequestException as e:
+        return f"Request error: {e}"
+    except Exception as e:
+        return f"Error: {e}"
+
+
+def _post_json_event(webhook_url, event, compress=False):
+    """
+    POST a single event as flat JSON.
+
+    Returns None on success, or an error message on failure.
+    """
+    try:
+        json_data = _json_dumps(event)
+    except Exception as e:
+        return f"Error: {e}"
+    return _post_body(webhook_url, json_data, 'application/json', compress)
+
+
+def _post_ndjson_events(webhook_url, events, compress=False):
+    """
+    POST several events in one request as newline-delimited JSON.
 
-    return '\n'.join(output_lines)
+    Each line is still one flat event object. Returns None on success, or an
+    error message on failure.
+    """
+    try:
+        body = b''.join(_json_dumps(event) + b'\n' for event in events)
+    except Exception as e:
+        return f"Error: {e}"
+    return _post_body(webhook_url, body, 'application/x-ndjson', compress)
 
 
-def send_json_events_to_webhook(webhook_url, events, batch_size=1, delay_between_batches=0.05):
+def send_json_events_to_webhook(webhook_url, events, batch_size=1, delay_between_batches=0.05,
+                                max_workers=16, ndjson=False, compress=False):
     """
     Send JSON events to a webhook URL.
 
-    Each JSON event is sent as a single HTTP request as a FLAT JSON object.
-    This ensures D&R rules can access fields at event/FIELD_NAME paths
+    By default each JSON event is sent as a single HTTP request as a FLAT JSON
+    object. This ensures D&R rules can access fields at event/FIELD_NAME paths
     (not nested in event/events/0/FIELD_NAME).
 
+    With ndjson=True, events are grouped batch_size at a time (e.g. 50) and
+    each group is POSTed as application/x-ndjson, one flat event per line.
+    This cuts the number of requests by batch_size, but only works if the
+    receiving webhook splits NDJSON bodies into separate events; a failed
+    request also fails the whole group. Leave it off unless the receiver is
+    known to support it.
+
+    With compress=True, request bodies larger than GZIP_MIN_BYTES are sent
+    with Content-Encoding: gzip. Single flat events are usually below that,
+    so this mainly shrinks NDJSON batches. Leave it off for receivers that
+    do not accept gzip-encoded requests.
+
+    Requests run concurrently on a thread pool. They are paced by a token
+    bucket averaging one request per delay_between_batches, with short bursts
+    allowed, rather than sleeping after every event.
+
     Args:
         webhook_url: The webhook endpoint URL
         events: List of event dictionaries to send
-        batch_size: Number of events to send per request (default: 1 for individual events)
-        delay_between_batches: Seconds to wait between requests (default: 0.05)
+        batch_size: Number of events per request in NDJSON mode (default: 1)
+        delay_between_batches: Average seconds between requests (default: 0.05)
+        max_workers: Maximum number of requests in flight at once (default: 16,
+            capped at MAX_WEBHOOK_WORKERS)
+        ndjson: Send batch_size events per request as NDJSON (default: False)
+        compress: Gzip request bodies larger than GZIP_MIN_BYTES (default: False)
 
     Returns:
         Tuple of (successful_count, failed_count)
@@ -349,51 +872,48 @@ def send_json_events_to_webhook(webhook_url, events, batch_size=1, delay_between
     successful = 0
     failed = 0
     total = len(events)
+    batch_size = max(1, batch_size) if ndjson else 1
 
-    print(f"Sending {total} JSON events to webhook (flat format): {webhook_url}", file=sys.stderr)
+    if ndjson:
+        print(f"Sending {total} JSON events to webhook (NDJSON, {batch_size} per request): "
+              f"{webhook_url}", file=sys.stderr)
+    else:
+        print(f"Sending {total} JSON events to webhook (flat format): {webhook_url}", file=sys.stderr)
 
-    # Send each event individually as flat JSON (not wrapped in events array)
-    for i, event in enumerate(events):
-        event_num = i + 1
+    bucket = TokenBucket(1 / delay_between_batches if delay_between_batches > 0 else 0)
 
-        # Send event directly as flat JSON for D&R rule compatibility
-        payload = event
+    max_workers = min(max(1, max_workers), MAX_WEBHOOK_WORKERS)
 
-        try:
-            json_data = json.dumps(payload).encode('utf-8')
-            request = Request(
-                webhook_url,
-                data=json_data,
-                headers={
-                    'Content-Type': 'application/json',
-                    'User-Agent': 'LogTemplateProcessor/1.0'
-                },
-                method='POST'
-            )
-
-            with urlopen(request, timeout=30) as response:
-                status = response.getcode()
-                if 200 <= status < 300:
-                    successful += 1
-                    if event_num % 10 == 0 or event_num == total:
-                        print(f"  Progress: {event_num}/{total} events sent", file=sys.stderr)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # futures map to (first event number, events in the request)
+        futures = {}
+        if ndjson:
+            for start in range(0, total, batch_size):
+                chunk = events[start:start + batch_size]
+                bucket.acquire()
+                future = executor.submit(_post_ndjson_events, webhook_url, chunk, compress)
+                futures[future] = (start + 1, len(chunk))
+        else:
+            # Send each event individually as flat JSON (not wrapped in events array)
+            for i, event in enumerate(events):
+                bucket.acquire()
+                future = executor.submit(_post_json_event, webhook_url, event, compress)
+                futures[future] = (i + 1, 1)
+
+        for future in as_completed(futures):
+            error = future.result()
+            first, count = futures[future]
+            if error is None:
+                done = successful + failed
+                successful += count
+                if (done + count) // 10 > done // 10 or done + count == total:
+                    print(f"  Progress: {done + count}/{total} events sent", file=sys.stderr)
+            else:
+                failed += count
+                if count == 1:
+                    print(f"  Event {first}: {error}", file=sys.stderr)
                 else:
-                    failed += 1
-                    print(f"  Event {event_num}: Failed with HTTP {status}", file=sys.stderr)
-
-        except HTTPError as e:
-            failed += 1
-            print(f"  Event {event_num}: HTTP error {e.code}: {e.reason}", file=sys.stderr)
-        except URLError as e:
-            failed += 1
-            print(f"  Event {event_num}: URL error: {e.reason}", file=sys.stderr)
-        except Exception as e:
-            failed += 1
-            print(f"  Event {event_num}: Error: {e}", file=sys.stderr)
-
-        # Small delay between requests to avoid overwhelming the webhook
-        if delay_between_batches > 0:
-            time.sleep(delay_between_batches)
+                    print(f"  Events {first}-{first + count - 1}: {error}", file=sys.stderr)
 
     print(f"Complete: {successful} successful, {failed} failed out of {total} events", file=sys.stderr)
     return successful, failed
@@ -409,11 +929,10 @@ def main():
     output_dest = sys.argv[2] if len(sys.argv) > 2 else None
 
     # Fetch template from URL or local file
-    template_content = fetch_template(template_source)
+    template_content = fetch_template_bytes(template_source)
 
-    # Process the template (returns list for JSON, string for line-based)
-    output_content = process_template(template_content)
-    is_json_output = isinstance(output_content, list)
+    # Process the template (events for JSON, rendered lines for line-based)
+    is_json_output, output_content = process_template_items(template_content)
 
     # Write output
     if output_dest:
@@ -423,8 +942,9 @@ def main():
                 # JSON events - send as structured objects
                 successful, failed = send_json_events_to_webhook(output_dest, output_content)
             else:
-                # Line-based logs - send as raw strings
-                log_lines = [line for line in output_content.split('\n') if line.strip()]
+                # Line-based logs - send as raw strings, skipping lines that
+                # rendered blank (e.g. a false {% if %})
+                log_lines = [line for line in output_content if line.strip()]
                 successful, failed = send_to_webhook(output_dest, log_lines)
             if failed > 0:
                 sys.exit(1)
@@ -435,17 +955,21 @@ def main():
                     if is_json_output:
                         json.dump(output_content, f, indent=2)
                     else:
-                        f.write(output_content)
+                        f.write('\n'.join(output_content))
                 print(f"Successfully wrote output to: {output_dest}", file=sys.stderr)
             except IOError as e:
                 print(f"Error writing output file: {e}", file=sys.stderr)
                 sys.exit(1)
     else:
         # Print to stdout if no output destination specified
+        # One encoded write instead of print()'s text-layer round trip
         if is_json_output:
-            print(json.dumps(output_content, indent=2))
+            text = json.dumps(output_content, indent=2)
         else:
-            print(output_content)
+            text = '\n'.join(output_content)
+        sys.stdout.flush()
+        sys.stdout.buffer.write((text + '\n').encode('utf-8'))
+        sys.stdout.flush()
 
 
 if __name__ == "__main__":
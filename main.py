@@ -7,24 +7,40 @@ and sends them to LimaCharlie webhooks for D&R rule testing.
 
 Endpoints:
     POST /load - Load demo events from template URL to webhook
+    GET /jobs/<job_id> - Status of a /load request queued with Prefer: respond-async
     GET /health - Health check endpoint
 """
 
 import os
 import json
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify
 
 # Import core functions from the existing template processor
 from log_template_processor import (
-    fetch_template,
-    process_template,
+    fetch_template_bytes,
+    process_template_items,
     send_json_events_to_webhook,
     send_to_webhook,
     is_url,
+    MAX_WEBHOOK_WORKERS,
 )
 
 app = Flask(__name__)
 
+# Background /load jobs (see load_demo_data). Job state lives in this process,
+# so it is only visible to requests served by the same gunicorn worker.
+JOB_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.environ.get('LOAD_JOB_WORKERS', 4)))
+# Queued plus running jobs allowed at once; further async requests get 503
+MAX_ACTIVE_JOBS = int(os.environ.get('LOAD_JOB_MAX_ACTIVE', 16))
+MAX_TRACKED_JOBS = 1000
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+_active_jobs = 0
+
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -32,55 +48,29 @@ def health():
     return jsonify({'status': 'healthy'}), 200
 
 
-@app.route('/load', methods=['POST'])
-def load_demo_data():
+def _run_load(template_url, webhook_url, delay, concurrency):
     """
-    Load demo events from a template URL and send to a webhook.
-
-    Request body (JSON):
-        template_url: URL to fetch JSON event template from (required)
-        webhook_url: Webhook URL to send events to (required)
-        delay: Delay between events in seconds (optional, default: 0.05)
+    Fetch, render, and send a template.
 
     Returns:
-        JSON with status, event counts, and any errors
+        Tuple of (result dict, HTTP status code)
     """
     try:
-        data = request.get_json()
-
-        if not data:
-            return jsonify({'error': 'Request body must be JSON'}), 400
-
-        template_url = data.get('template_url')
-        webhook_url = data.get('webhook_url')
-        delay = data.get('delay', 0.05)
-
-        if not template_url:
-            return jsonify({'error': 'Missing required parameter: template_url'}), 400
-
-        if not webhook_url:
-            return jsonify({'error': 'Missing required parameter: webhook_url'}), 400
-
-        if not is_url(template_url):
-            return jsonify({'error': 'template_url must be a valid URL'}), 400
-
-        if not is_url(webhook_url):
-            return jsonify({'error': 'webhook_url must be a valid URL'}), 400
-
         # Fetch and process the template
-        template_content = fetch_template(template_url)
-        output_content = process_template(template_content)
+        template_content = fetch_template_bytes(template_url)
+        is_json, output_content = process_template_items(template_content)
 
         # Send to webhook
-        if isinstance(output_content, list):
+        if is_json:
             # JSON events
             successful, failed = send_json_events_to_webhook(
-                webhook_url, output_content, delay_between_batches=delay
+                webhook_url, output_content, delay_between_batches=delay,
+                max_workers=concurrency
             )
             total = len(output_content)
         else:
-            # Line-based logs
-            log_lines = [line for line in output_content.split('\n') if line.strip()]
+            # Line-based logs; lines can render blank (e.g. a false {% if %})
+            log_lines = [line for line in output_content if line.strip()]
             successful, failed = send_to_webhook(webhook_url, log_lines)
             total = len(log_lines)
 
@@ -93,14 +83,140 @@ def load_demo_data():
         }
 
         if failed > 0:
-            return jsonify(result), 207  # Multi-Status
+            return result, 207  # Multi-Status
 
-        return jsonify(result), 200
+        return result, 200
 
     except json.JSONDecodeError as e:
-        return jsonify({'error': f'Invalid JSON in template: {str(e)}'}), 400
+        return {'error': f'Invalid JSON in template: {str(e)}'}, 400
+    except SystemExit:
+        # fetch_template_bytes exits after printing the fetch error
+        return {'error': 'Failed to load demo data: could not fetch template'}, 502
     except Exception as e:
-        return jsonify({'error': f'Failed to load demo data: {str(e)}'}), 500
+        return {'error': f'Failed to load demo data: {str(e)}'}, 500
+
+
+def _run_load_job(job_id, template_url, webhook_url, delay, concurrency):
+    """Run a queued /load request and record its outcome in _jobs."""
+    global _active_jobs
+    try:
+        with _jobs_lock:
+            _jobs[job_id]['status'] = 'running'
+
+        result, status_code = _run_load(template_url, webhook_url, delay, concurrency)
+
+        with _jobs_lock:
+            job = _jobs[job_id]
+            job['status'] = 'failed' if 'error' in result else 'done'
+            job['http_status'] = status_code
+            job['result'] = result
+    finally:
+        with _jobs_lock:
+            _active_jobs -= 1
+
+
+def _wants_async():
+    """True if the client sent Prefer: respond-async (RFC 7240)."""
+    prefer = request.headers.get('Prefer', '')
+    return any(p.strip().lower() == 'respond-async' for p in prefer.split(','))
+
+
+@app.route('/load', methods=['POST'])
+def load_demo_data():
+    """
+    Load demo events from a template URL and send to a webhook.
+
+    The request is handled synchronously by default. With a
+    "Prefer: respond-async" header it is queued instead and the response is
+    202 with a job id to poll at GET /jobs/<job_id>, or 503 once
+    MAX_ACTIVE_JOBS jobs are already queued or running. Only use async mode
+    when CPU stays allocated after the response (e.g. Cloud Run's
+    "CPU always allocated"); otherwise the background job is throttled.
+
+    Request body (JSON):
+        template_url: URL to fetch JSON event template from (required)
+        webhook_url: Webhook URL to send events to (required)
+        delay: Delay between events in seconds (optional, default: 0.05)
+        concurrency: Maximum webhook requests in flight (optional, default: 16, max: 32)
+
+    Returns:
+        JSON with status, event counts, and any errors
+    """
+    data = request.get_json(silent=True)
+
+    if not data or not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be JSON'}), 400
+
+    template_url = data.get('template_url')
+    webhook_url = data.get('webhook_url')
+    delay = data.get('delay', 0.05)
+    concurrency = data.get('concurrency', 16)
+
+    if not template_url:
+        return jsonify({'error': 'Missing required parameter: template_url'}), 400
+
+    if not webhook_url:
+        return jsonify({'error': 'Missing required parameter: webhook_url'}), 400
+
+    if not is_url(template_url):
+        return jsonify({'error': 'template_url must be a valid URL'}), 400
+
+    if not is_url(webhook_url):
+        return jsonify({'error': 'webhook_url must be a valid URL'}), 400
+
+    if (not isinstance(concurrency, int) or isinstance(concurrency, bool)
+            or not 1 <= concurrency <= MAX_WEBHOOK_WORKERS):
+        return jsonify({
+            'error': f'concurrency must be an integer from 1 to {MAX_WEBHOOK_WORKERS}'
+        }), 400
+
+    if not _wants_async():
+        result, status_code = _run_load(template_url, webhook_url, delay, concurrency)
+        return jsonify(result), status_code
+
+    global _active_jobs
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        if _active_jobs >= MAX_ACTIVE_JOBS:
+            response = jsonify({'error': 'Too many queued load jobs; retry later'})
+            response.headers['Retry-After'] = '30'
+            return response, 503
+        _active_jobs += 1
+        _jobs[job_id] = {'status': 'queued', 'template_url': template_url}
+        # Forget the oldest finished jobs once the table is full; active jobs
+        # are capped well below MAX_TRACKED_JOBS, so one is always found
+        while len(_jobs) > MAX_TRACKED_JOBS:
+            oldest = next((k for k, v in _jobs.items() if v['status'] in ('done', 'failed')), None)
+            if oldest is None:
+                break
+            del _jobs[oldest]
+
+    try:
+        JOB_EXECUTOR.submit(_run_load_job, job_id, template_url, webhook_url, delay, concurrency)
+    except RuntimeError:
+        # Executor is shutting down
+        with _jobs_lock:
+            _active_jobs -= 1
+            del _jobs[job_id]
+        return jsonify({'error': 'Service is shutting down; retry later'}), 503
+
+    response = jsonify({'job_id': job_id, 'status': 'queued'})
+    response.headers['Location'] = f'/jobs/{job_id}'
+    response.headers['Preference-Applied'] = 'respond-async'
+    return response, 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Return the status, and once finished the result, of a queued /load job."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        job = dict(job) if job is not None else None
+
+    if job is None:
+        return jsonify({'error': f'Unknown job: {job_id}'}), 404
+
+    return jsonify({'job_id': job_id, **job}), 200
 
 
 @app.route('/', methods=['GET'])
@@ -116,13 +232,19 @@ def index():
                     'template_url': 'URL to fetch JSON event template from (required)',
                     'webhook_url': 'Webhook URL to send events to (required)',
                     'delay': 'Delay between events in seconds (optional, default: 0.05)',
-                }
+                    'concurrency': 'Maximum webhook requests in flight (optional, default: 16, max: 32)',
+                },
+                'headers': {
+                    'Prefer': 'respond-async to queue the load and return 202 with a job_id (optional)',
+                },
             },
+            'GET /jobs/<job_id>': 'Status and result of a queued /load job',
             'GET /health': 'Health check endpoint',
         }
     }), 200
 
 
 if __name__ == '__main__':
+    # Local development only; the container serves main:app with gunicorn
     port = int(os.environ.get('PORT', 8080))
     app.run(host='0.0.0.0', port=port, debug=False)